@@ -0,0 +1,77 @@
+"""
+Measure cold start and per-job client overhead of s3_tools.
+
+Every measurement runs in a fresh interpreter, so imports are cold.
+No requests are sent, clients are only created. Usage:
+
+    python benchmarks/startup.py [--runs 5]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SNIPPETS = {
+    "import s3_tools": """
+t = time.perf_counter()
+import s3_tools
+result = time.perf_counter() - t
+assert "boto3" not in sys.modules and "backoff" not in sys.modules
+""",
+    "import boto3": """
+t = time.perf_counter()
+import boto3
+from botocore.config import Config
+result = time.perf_counter() - t
+""",
+    "first get_client (with boto3 import)": """
+from s3_tools import get_client
+t = time.perf_counter()
+get_client("key", "secret", "https://s3.example.com")
+result = time.perf_counter() - t
+""",
+    "cached get_client, per job": """
+from s3_tools import get_client
+get_client("key", "secret", "https://s3.example.com")
+t = time.perf_counter()
+for _ in range(100):
+    get_client("key", "secret", "https://s3.example.com")
+result = (time.perf_counter() - t) / 100
+""",
+    "new session + client, per job (old scripts)": """
+import boto3
+from botocore.config import Config
+boto3.session.Session(aws_access_key_id="key", aws_secret_access_key="secret").client(
+    "s3", endpoint_url="https://s3.example.com", config=Config(max_pool_connections=200)
+)
+t = time.perf_counter()
+for _ in range(10):
+    boto3.session.Session(aws_access_key_id="key", aws_secret_access_key="secret").client(
+        "s3", endpoint_url="https://s3.example.com", config=Config(max_pool_connections=200)
+    )
+result = (time.perf_counter() - t) / 10
+""",
+}
+
+
+def measure(snippet):
+    code = f"import sys, time\nsys.path.insert(0, {str(ROOT)!r})\n{snippet}\nprint(result)"
+    output = subprocess.check_output([sys.executable, "-c", code])
+    return float(output)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+    args = parser.parse_args()
+
+    for name, snippet in SNIPPETS.items():
+        times = [measure(snippet) for _ in range(args.runs)]
+        print(f"{name:45} median {statistics.median(times) * 1000:10.4f} ms")
+
+
+if __name__ == "__main__":
+    main()
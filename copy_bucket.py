@@ -0,0 +1,79 @@
+"""Copy all files from S3 bucket prefix or from list of keys to another bucket/prefix server side."""
+import argparse
+import time
+
+from s3_tools import copy_bucket, get_client
+from s3_tools.clients import endpoint_url
+from s3_tools.copy import MAX_PART_WORKERS, MAX_WORKERS, check_copy_target
+from s3_tools.log import setup_logger
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--s3-access-key", help="Access Key Id",
+    )
+    parser.add_argument("--s3-secret-key", help="Secret Access Key")
+    parser.add_argument("--endpoint", help="Endpoint url")
+    parser.add_argument("--bucket", help="source S3 bucket")
+    parser.add_argument("--prefix", help="source S3 bucket prefix")
+    parser.add_argument("--dest-bucket", help="target S3 bucket (source bucket by default)")
+    parser.add_argument("--dest-prefix", help="target S3 bucket prefix, replaces source prefix")
+    parser.add_argument(
+        "--skip-existing", action="store_true", help="Skip existing files",
+    )
+    parser.add_argument("--keys-file", help="File with list of keys to copy (one key - one line)")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Number of copy threads")
+    parser.add_argument(
+        "--part-workers",
+        type=int,
+        default=MAX_PART_WORKERS,
+        help="Number of threads copying parts of big objects, shared by all copies",
+    )
+    parser.add_argument("--storage-class", help="Storage class of copies (source storage class by default)")
+
+    args = parser.parse_args(argv)
+    if not args.dest_bucket and not args.dest_prefix:
+        parser.error("--dest-bucket or --dest-prefix is required")
+    try:
+        check_copy_target(
+            args.bucket, args.dest_bucket or args.bucket, args.prefix, args.dest_prefix, args.keys_file
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def main(argv=None):
+    started = time.monotonic()
+    args = parse_args(argv)
+
+    dest_bucket = args.dest_bucket or args.bucket
+    endpoint = endpoint_url(args.endpoint)
+
+    logger = setup_logger(
+        "s3_copying", f"s3_copy_{args.bucket}.log", f"s3_copy-errors_{args.bucket}.log"
+    )
+    logger.info(
+        f"Copy {args.bucket}/{args.prefix or ''} to {dest_bucket}/{args.dest_prefix or ''}, {endpoint}"
+    )
+
+    client = get_client(args.s3_access_key, args.s3_secret_key, endpoint)
+    copy_bucket(
+        args.bucket,
+        dest_bucket,
+        client,
+        args.prefix,
+        args.dest_prefix,
+        args.keys_file,
+        skip_existing=args.skip_existing,
+        max_workers=args.workers,
+        storage_class=args.storage_class,
+        max_part_workers=args.part_workers,
+    )
+    logger.info(f"Finished in {time.monotonic() - started:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
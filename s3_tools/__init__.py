@@ -0,0 +1,22 @@
+"""
+S3 transfer helpers used by the command line scripts.
+
+Nothing heavy is imported here: boto3, backoff and urllib3 are imported on
+first use, so the package is cheap to import from long-running workers.
+"""
+from .archive import archive_and_upload
+from .clients import get_client
+from .copy import copy_bucket
+from .download import download_bucket, download_keys, download_prefix
+from .upload import upload_file, upload_tree
+
+__all__ = [
+    "archive_and_upload",
+    "copy_bucket",
+    "download_bucket",
+    "download_keys",
+    "download_prefix",
+    "get_client",
+    "upload_file",
+    "upload_tree",
+]
@@ -0,0 +1,239 @@
+"""Compress top level folders into archives (7z or tar) and upload them to S3 bucket."""
+import glob
+import json
+import logging
+import os
+import re
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from .codecs import CODECS, DEFAULT_CODEC, MIN_MBPS, choose_codec, folder_size
+from .download import iter_pages
+from .upload import upload_file
+
+logger = logging.getLogger("s3_uploading")
+
+STORAGE_CLASS = "DEEP_ARCHIVE"
+MAX_CONCURRENCY = 24
+
+
+def get_valid_filename(s):
+    """
+    Return the given string converted to a string.
+
+    That can be used for a clean
+    filename. Remove leading and trailing spaces; convert other spaces to
+    underscores; and remove anything that is not an alphanumeric, dash,
+    underscore, or dot.
+    >>> get_valid_filename("john's portrait in 2004.jpg")
+    'johns_portrait_in_2004.jpg'
+    """
+    s = str(s).strip().replace(' ', '_')
+    s = re.sub(r'(?u)[^-\w.]', '', s)
+    return re.sub(r'[^\x00-\x7F]+', '_', s)
+
+
+def archive_name(path: Path, suffix):
+    """Return name of the archive for folder ``path``, it is also the S3 key."""
+    return get_valid_filename(Path(path).with_suffix(suffix).name)
+
+
+def record_stats(stats_file, record):
+    """Append archive ``record`` to ``stats_file`` as JSON line."""
+    logger.info(f"Archive stats: {record}")
+    if stats_file:
+        with open(str(stats_file), "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def compress_folder(folder_path: Path, tmp_folder: Path, codec=DEFAULT_CODEC, adaptive=False, min_mbps=MIN_MBPS, stats_file=None, original_size=None):
+    """
+    Compress ``folder_path`` into archive in ``tmp_folder``, return archive path.
+
+    With ``adaptive`` the codec is chosen by ``choose_codec`` from a sample
+    of the folder instead of using ``codec``. The decision, achieved ratio
+    and wall clock MB/s (``wall_mbps``) are written with ``record_stats``.
+    If compression fails partial archive is removed and error is raised.
+    """
+    samples = []
+    sample_cpu = 0
+    if adaptive:
+        codec, samples = choose_codec(folder_path, tmp_folder, min_mbps=min_mbps)
+        sample_cpu = sum(sample["cpu_seconds"] for sample in samples)
+    archive_path = Path(tmp_folder) / archive_name(folder_path, codec.suffix)
+    if archive_path.is_file():
+        logger.warning(f"Tmp file exists {archive_path}, will remove it!")
+        os.remove(str(archive_path))
+
+    if original_size is None:
+        original_size = folder_size(folder_path)
+    started = time.monotonic()
+    try:
+        cpu = codec.compress_folder(folder_path, archive_path)
+    except Exception:
+        # do not leave truncated archive behind
+        if archive_path.is_file():
+            os.remove(str(archive_path))
+        raise
+    seconds = time.monotonic() - started
+
+    archive_size = archive_path.stat().st_size
+    record_stats(
+        stats_file,
+        {
+            "folder": str(folder_path),
+            "archive": archive_path.name,
+            "codec": codec.name,
+            "adaptive": adaptive,
+            "samples": samples,
+            "sample_cpu_seconds": round(sample_cpu, 3),
+            "original_bytes": original_size,
+            "archive_bytes": archive_size,
+            "ratio": round(original_size / max(archive_size, 1), 3),
+            "seconds": round(seconds, 3),
+            "cpu_seconds": round(cpu, 3),
+            "wall_mbps": round(original_size / 1e6 / max(seconds, 1e-6), 1),
+        },
+    )
+    return archive_path
+
+
+Job = namedtuple("Job", ["path", "size", "is_dir"])
+
+
+def existing_keys(client, bucket, prefix_path: str = None):
+    """
+    Return ``{key: size}`` of objects which ``archive_and_upload`` could have uploaded.
+
+    Archives are stored in the bucket root and plain files under
+    ``prefix_path``, so only these two levels are listed.
+    """
+    prefixes = [None]
+    if prefix_path:
+        prefixes.append(f"{prefix_path.strip('/')}/")
+    keys = {}
+    for prefix_key in prefixes:
+        for contents in iter_pages(client, bucket, prefix_key, delimiter="/"):
+            for i in contents:
+                keys[i["Key"]] = i.get("Size")
+    return keys
+
+
+def plan_jobs(folder_path: Path, final_path: Path, keys, suffixes):
+    """
+    Return jobs for top level entries of ``final_path`` missing in ``keys``.
+
+    Folders are missing if there is no archive with any of ``suffixes``,
+    files if there is no object with the same size. Jobs are ordered
+    largest first.
+    """
+    jobs = []
+    for file_path in glob.iglob(str(final_path / "**"), recursive=False):
+        file_path = Path(file_path)
+        if file_path.is_dir():
+            for suffix in suffixes:
+                s3_key = archive_name(file_path, suffix)
+                if s3_key in keys:
+                    logger.info(f"Object with key {s3_key} exist skipping..")
+                    break
+            else:
+                jobs.append(Job(file_path, folder_size(file_path), True))
+        elif file_path.is_file():
+            s3_key = str(file_path.relative_to(folder_path))
+            size = file_path.stat().st_size
+            if keys.get(s3_key) == size:
+                logger.info(f"Object with key {s3_key} exist skipping..")
+                continue
+            jobs.append(Job(file_path, size, False))
+    jobs.sort(key=lambda job: job.size, reverse=True)
+    return jobs
+
+
+def archive_and_upload(
+    folder_path: Path,
+    tmp_folder: Path,
+    bucket,
+    client,
+    prefix_path: str = None,
+    guess_type=False,
+    adaptive=False,
+    min_mbps=MIN_MBPS,
+    stats_file=None,
+):
+    """
+    Upload every top level entry of ``folder_path`` (or its ``prefix_path`` subfolder).
+
+    Folders are compressed into an archive in ``tmp_folder`` first and the
+    archive is removed after upload, files are uploaded as is. Archives are
+    ``<name>.7z`` by default, with ``adaptive`` codec is chosen for every
+    folder (see ``compress_folder``) and archive may be ``<name>.tar.gz``,
+    ``.tar.bz2`` or ``.tar.xz`` as well.
+
+    Destination is listed once up front, only entries missing there are
+    planned (see ``plan_jobs``) and processed largest first.
+    """
+    folder_path = Path(folder_path)
+    tmp_folder = Path(tmp_folder)
+    if prefix_path:
+        final_path = folder_path / prefix_path
+    else:
+        final_path = folder_path
+    suffixes = sorted({codec.suffix for codec in CODECS}) if adaptive else [DEFAULT_CODEC.suffix]
+
+    keys = existing_keys(client, bucket, prefix_path)
+    jobs = plan_jobs(folder_path, final_path, keys, suffixes)
+    total_count = len(jobs)
+    total_bytes = sum(job.size for job in jobs)
+    logger.info(f"Planned {total_count} uploads, {total_bytes / 1e9:.2f} GB, {len(keys)} objects already in bucket")
+
+    started = time.monotonic()
+    done_bytes = 0
+    for uploaded_count, job in enumerate(jobs, 1):
+        if done_bytes:
+            elapsed = time.monotonic() - started
+            eta = (total_bytes - done_bytes) * elapsed / done_bytes
+            logger.info(
+                f"Done {done_bytes / 1e9:.2f}/{total_bytes / 1e9:.2f} GB, "
+                f"{done_bytes / 1e6 / elapsed:.1f} MB/s, ETA {eta / 60:.1f} min"
+            )
+
+        if job.is_dir:
+            remove_file = True
+            try:
+                file_path_7z_to_upload = compress_folder(
+                    job.path,
+                    tmp_folder,
+                    adaptive=adaptive,
+                    min_mbps=min_mbps,
+                    stats_file=stats_file,
+                    original_size=job.size,
+                )
+            except Exception as e:
+                logger.error(f"Failed to zip folder {job.path}: {e}")
+                done_bytes += job.size
+                continue
+            related_file_path = file_path_7z_to_upload.relative_to(tmp_folder)
+        else:
+            remove_file = False
+            file_path_7z_to_upload = job.path
+            related_file_path = file_path_7z_to_upload.relative_to(folder_path)
+        s3_key = str(related_file_path)
+        logger.info(
+            f"Uploading file {file_path_7z_to_upload} with key {s3_key}"
+        )
+        upload_file(
+            client,
+            bucket,
+            str(file_path_7z_to_upload),
+            s3_key,
+            uploaded_count,
+            total_count,
+            guess_type=guess_type,
+            storage_class=STORAGE_CLASS,
+            max_concurrency=MAX_CONCURRENCY,
+            remove_file=remove_file,
+            check_existing=False,
+        )
+        done_bytes += job.size
+    logger.info(f"Uploaded {total_bytes / 1e9:.2f} GB in {time.monotonic() - started:.1f}s")
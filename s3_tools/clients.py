@@ -0,0 +1,51 @@
+"""Shared S3 clients.
+
+boto3 is imported on the first call and clients are cached per
+credentials/endpoint, so a long-running worker pays the import and
+client startup cost once instead of once per file.
+"""
+import threading
+
+MAX_POOL_CONNECTIONS = 200
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def endpoint_url(endpoint):
+    """Return full endpoint url for the ``--endpoint`` host passed to the scripts."""
+    if not endpoint:
+        return None
+    if "://" in endpoint:
+        return endpoint
+    return f"https://{endpoint}"
+
+
+def get_client(access_key=None, secret_key=None, endpoint=None):
+    """
+    Return S3 client for given credentials, creating it on first use.
+
+    boto3 clients are thread safe, so the same client is shared between
+    all worker threads and all calls in the process.
+    """
+    cache_key = (access_key, secret_key, endpoint)
+    client = _clients.get(cache_key)
+    if client is not None:
+        return client
+    with _clients_lock:
+        client = _clients.get(cache_key)
+        if client is None:
+            import boto3
+            from botocore.config import Config
+
+            session = boto3.session.Session(
+                aws_access_key_id=access_key, aws_secret_access_key=secret_key,
+            )
+            client = session.client(
+                "s3",
+                endpoint_url=endpoint,
+                use_ssl=True,
+                config=Config(max_pool_connections=MAX_POOL_CONNECTIONS),
+            )
+            _clients[cache_key] = client
+    return client
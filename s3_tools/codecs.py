@@ -0,0 +1,221 @@
+"""Archive codecs and sample based codec selection for folder archives."""
+import bz2
+import logging
+import lzma
+import os
+import subprocess
+import tarfile
+import time
+import zlib
+from pathlib import Path
+
+logger = logging.getLogger("s3_uploading")
+
+SAMPLE_BYTES = 4 * 1024 * 1024
+SAMPLE_FILE_BYTES = 256 * 1024
+# skip codecs slower than this, MB of input per CPU second
+MIN_MBPS = 20.0
+# store folder as is if no codec saves at least this share of bytes
+MIN_SAVINGS = 0.05
+# 7z exit code 1 is a warning (e.g. some file was locked), 2 and more is fatal
+SEVEN_ZIP_FATAL = 2
+
+
+class SevenZipCodec(object):
+    """
+    Compress with ``7z`` command using given method switches.
+
+    ``compress_folder`` and ``compress_sample`` return CPU seconds used by
+    the 7z process itself, other threads of this process are not counted.
+    """
+
+    suffix = ".7z"
+
+    def __init__(self, name, method_args):
+        self.name = name
+        self.method_args = list(method_args)
+
+    def _compress_args(self, archive_path, path):
+        return ["7z", "a", "-t7z", str(archive_path), *self.method_args, "-r", str(path)]
+
+    @staticmethod
+    def _run(compress_args, **kwargs):
+        """Run command, return its CPU seconds, raise on fatal exit code."""
+        process = subprocess.Popen(compress_args, **kwargs)
+        # wait4 reports resources of this child only, unlike RUSAGE_CHILDREN
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        if process.returncode >= SEVEN_ZIP_FATAL:
+            raise subprocess.CalledProcessError(process.returncode, compress_args)
+        return usage.ru_utime + usage.ru_stime
+
+    def compress_folder(self, folder_path: Path, archive_path: Path):
+        compress_args = self._compress_args(archive_path, folder_path)
+        logger.info(f"Running {compress_args}")
+        return self._run(compress_args)
+
+    def compress_sample(self, data, tmp_folder: Path):
+        sample_path = Path(tmp_folder) / f".sample-{os.getpid()}"
+        archive_path = sample_path.with_suffix(self.suffix)
+        try:
+            sample_path.write_bytes(data)
+            cpu = self._run(
+                self._compress_args(archive_path, sample_path),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            return archive_path.stat().st_size, cpu
+        finally:
+            for path in (sample_path, archive_path):
+                if path.is_file():
+                    os.remove(str(path))
+
+
+class TarCodec(object):
+    """
+    Compress into tar archive with one of stdlib codecs (gz, bz2, xz).
+
+    Empty ``compression`` makes plain uncompressed ``.tar``. CPU seconds
+    returned by ``compress_folder`` and ``compress_sample`` are of the
+    calling thread only.
+    """
+
+    _compressors = {
+        "": lambda data, level: data,
+        "gz": lambda data, level: zlib.compress(data, level),
+        "bz2": lambda data, level: bz2.compress(data, level),
+        "xz": lambda data, level: lzma.compress(data, preset=level),
+    }
+
+    def __init__(self, name, compression, level=None):
+        self.name = name
+        self.compression = compression
+        self.level = level
+        self.suffix = f".tar.{compression}" if compression else ".tar"
+
+    def compress_folder(self, folder_path: Path, archive_path: Path):
+        kwargs = {}
+        if self.compression:
+            kwargs["preset" if self.compression == "xz" else "compresslevel"] = self.level
+        logger.info(f"Creating {archive_path} with {self.name}")
+        started = time.thread_time()
+        with tarfile.open(str(archive_path), f"w:{self.compression}", **kwargs) as tar:
+            tar.add(str(folder_path), arcname=Path(folder_path).name)
+        return time.thread_time() - started
+
+    def compress_sample(self, data, tmp_folder: Path):
+        started = time.thread_time()
+        compressed_size = len(self._compressors[self.compression](data, self.level))
+        return compressed_size, time.thread_time() - started
+
+
+LZMA2_9 = SevenZipCodec(
+    "7z-lzma2-9", ["-m0=lzma2", "-mx=9", "-mfb=64", "-md=32m", "-ms=on", "-mmt=8"]
+)
+STORE = SevenZipCodec("7z-store", ["-mx=0", "-mmt=8"])
+# needs nothing but stdlib, used when 7z is not available
+TAR_STORE = TarCodec("tar", "")
+# preferred first, used if no candidate saves enough
+STORE_CODECS = [STORE, TAR_STORE]
+
+CODECS = [
+    STORE,
+    TAR_STORE,
+    SevenZipCodec("7z-lzma2-1", ["-m0=lzma2", "-mx=1", "-ms=on", "-mmt=8"]),
+    SevenZipCodec("7z-lzma2-3", ["-m0=lzma2", "-mx=3", "-ms=on", "-mmt=8"]),
+    LZMA2_9,
+    TarCodec("tar-gz-1", "gz", 1),
+    TarCodec("tar-gz-6", "gz", 6),
+    TarCodec("tar-bz2-9", "bz2", 9),
+    TarCodec("tar-xz-1", "xz", 1),
+]
+
+DEFAULT_CODEC = LZMA2_9
+
+
+def _walk_files(folder_path: Path):
+    for root, _, files in os.walk(str(folder_path)):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            try:
+                yield path, os.path.getsize(path)
+            except OSError:
+                pass
+
+
+def folder_size(folder_path: Path):
+    return sum(size for _, size in _walk_files(folder_path))
+
+
+def sample_folder(folder_path: Path, sample_bytes=SAMPLE_BYTES, file_bytes=SAMPLE_FILE_BYTES):
+    """
+    Return up to ``sample_bytes`` of data from files of ``folder_path``.
+
+    At most ``file_bytes`` is read from every file and files are taken with
+    a stride, so the sample covers the whole folder and not just its first
+    files.
+    """
+    files = list(_walk_files(folder_path))
+    readable = sum(min(size, file_bytes) for _, size in files)
+    stride = max(1, readable // sample_bytes)
+    chunks = []
+    size = 0
+    for path, _ in files[::stride]:
+        try:
+            with open(path, "rb") as f:
+                chunk = f.read(file_bytes)
+        except OSError:
+            continue
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= sample_bytes:
+            break
+    return b"".join(chunks)
+
+
+def choose_codec(folder_path: Path, tmp_folder: Path, candidates=CODECS, min_mbps=MIN_MBPS, min_savings=MIN_SAVINGS):
+    """
+    Compress a sample of ``folder_path`` with every candidate and pick one.
+
+    Candidates slower than ``min_mbps`` (MB of input per CPU second) or
+    saving less than ``min_savings`` of the sample are dropped, from the
+    rest the codec saving the most bytes per CPU second wins. If no
+    candidate is left the first of ``STORE_CODECS`` which compressed the
+    sample is used, ``TAR_STORE`` if none did (e.g. 7z is not installed).
+
+    Return ``(codec, results)`` where results are sample measurements of
+    every candidate: ``ratio``, ``cpu_seconds`` and ``cpu_mbps`` (MB of
+    input per CPU second).
+    """
+    data = sample_folder(folder_path)
+    results = []
+    if not data:
+        return TAR_STORE, results
+    best, best_score = None, 0
+    sampled = set()
+    for codec in candidates:
+        try:
+            compressed_size, cpu = codec.compress_sample(data, tmp_folder)
+        except Exception as e:
+            logger.warning(f"Failed to compress sample with {codec.name}: {e}")
+            continue
+        sampled.add(codec.name)
+        saved = len(data) - compressed_size
+        cpu_mbps = len(data) / 1e6 / max(cpu, 1e-6)
+        results.append(
+            {
+                "codec": codec.name,
+                "ratio": round(len(data) / max(compressed_size, 1), 3),
+                "cpu_seconds": round(cpu, 3),
+                "cpu_mbps": round(cpu_mbps, 1),
+            }
+        )
+        if cpu_mbps < min_mbps or saved < len(data) * min_savings:
+            continue
+        score = saved / max(cpu, 1e-6)
+        if score > best_score:
+            best, best_score = codec, score
+    if best is None:
+        best = next((codec for codec in STORE_CODECS if codec.name in sampled), TAR_STORE)
+    logger.info(f"Sampled {len(data)} bytes of {folder_path}: {results}, chose {best.name}")
+    return best, results
@@ -0,0 +1,257 @@
+"""Copy objects between buckets/prefixes server side, without local disk."""
+import concurrent.futures
+import logging
+import math
+from pathlib import Path
+
+from .clients import MAX_POOL_CONNECTIONS
+from .download import iter_keys_file, iter_pages
+from .pool import iter_completed
+
+logger = logging.getLogger("s3_copying")
+
+MAX_WORKERS = 24
+# part copies of all multipart objects share one pool of this size
+MAX_PART_WORKERS = 32
+# copy_object is limited to 5GB, bigger objects are copied in parallel parts anyway
+MULTIPART_THRESHOLD = 512 * 1024 * 1024
+PART_SIZE = 256 * 1024 * 1024
+MAX_PARTS = 10000
+# object copies submitted and not yet collected, per worker
+IN_FLIGHT_PER_WORKER = 4
+# headers copy_object keeps with MetadataDirective=COPY, set explicitly for multipart copy
+COPIED_HEADERS = (
+    "CacheControl",
+    "ContentDisposition",
+    "ContentEncoding",
+    "ContentLanguage",
+    "ContentType",
+    "Expires",
+    "Metadata",
+)
+
+
+def check_copy_target(bucket, dest_bucket, prefix_key=None, dest_prefix=None, keys_file: Path = None):
+    """
+    Raise ``ValueError`` if copy would write into its own source.
+
+    Within one bucket listed source prefix and destination prefix must not
+    be equal or nested (copied keys would be listed again), with keys file
+    they must differ.
+    """
+    if bucket != dest_bucket:
+        return
+    prefix_key = prefix_key or ""
+    dest_prefix = dest_prefix or ""
+    if keys_file:
+        if prefix_key == dest_prefix:
+            raise ValueError(
+                f"Destination prefix '{dest_prefix}' is the same as source prefix in bucket {bucket}"
+            )
+    elif dest_prefix.startswith(prefix_key) or prefix_key.startswith(dest_prefix):
+        raise ValueError(
+            f"Source prefix '{prefix_key}' and destination prefix '{dest_prefix}' "
+            f"overlap in bucket {bucket}"
+        )
+
+
+def dest_key_for(key, prefix_key=None, dest_prefix=None):
+    """Replace ``prefix_key`` at the start of ``key`` with ``dest_prefix``."""
+    if prefix_key and key.startswith(prefix_key):
+        key = key[len(prefix_key):]
+    return f"{dest_prefix or ''}{key}"
+
+
+def _head(client, bucket, key):
+    try:
+        obj = client.head_object(Bucket=bucket, Key=key)
+    except Exception:
+        return None
+    if obj["ResponseMetadata"]["HTTPStatusCode"] != 200:
+        return None
+    return obj
+
+
+def part_ranges(size, part_size=None):
+    """Return ``(part_number, first_byte, last_byte)`` of every part, at most ``MAX_PARTS``."""
+    part_size = max(part_size or PART_SIZE, math.ceil(size / MAX_PARTS))
+    return [
+        (number, start, min(start + part_size, size) - 1)
+        for number, start in enumerate(range(0, size, part_size), 1)
+    ]
+
+
+def _copy_multipart(client, bucket, k, dest_bucket, dest_key, size, storage_class, part_executor):
+    source = client.head_object(Bucket=bucket, Key=k)
+    create_kwargs = {"Bucket": dest_bucket, "Key": dest_key}
+    for header in COPIED_HEADERS:
+        if source.get(header):
+            create_kwargs[header] = source[header]
+    storage_class = storage_class or source.get("StorageClass")
+    if storage_class:
+        create_kwargs["StorageClass"] = storage_class
+    upload_id = client.create_multipart_upload(**create_kwargs)["UploadId"]
+
+    ranges = part_ranges(size)
+
+    def copy_part(part):
+        number, first, last = part
+        result = client.upload_part_copy(
+            Bucket=dest_bucket,
+            Key=dest_key,
+            UploadId=upload_id,
+            PartNumber=number,
+            CopySource={"Bucket": bucket, "Key": k},
+            CopySourceRange=f"bytes={first}-{last}",
+        )
+        return {"PartNumber": number, "ETag": result["CopyPartResult"]["ETag"]}
+
+    try:
+        parts = list(part_executor.map(copy_part, ranges))
+        client.complete_multipart_upload(
+            Bucket=dest_bucket,
+            Key=dest_key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+    except Exception:
+        client.abort_multipart_upload(Bucket=dest_bucket, Key=dest_key, UploadId=upload_id)
+        raise
+
+
+def copy_file(client, bucket, k, dest_bucket, dest_key, count, size=None, skip_existing=False, storage_class=None, part_executor=None):
+    """
+    Copy single key server side, return ``(dest_key, copied)``.
+
+    ``size`` and ``storage_class`` are taken from the listing, if size is
+    unknown source is checked with ``head_object``. Objects bigger than
+    ``MULTIPART_THRESHOLD`` are copied with ``upload_part_copy`` on
+    ``part_executor`` (own pool of ``MAX_PART_WORKERS`` if not given),
+    others with ``copy_object``. Both keep ``COPIED_HEADERS`` and storage
+    class of the source (or given ``storage_class``).
+    """
+    try:
+        if size is None:
+            source = _head(client, bucket, k)
+            if source is None:
+                logger.error(f"Source object {k} does not exist")
+                return dest_key, False
+            size = source.get("ContentLength")
+            storage_class = storage_class or source.get("StorageClass")
+        if skip_existing:
+            dest = _head(client, dest_bucket, dest_key)
+            if dest is not None and dest.get("ContentLength") == size:
+                logger.info(f"Object {dest_key} already exists.")
+                return dest_key, True
+        if size > MULTIPART_THRESHOLD:
+            if part_executor is None:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_PART_WORKERS) as executor:
+                    _copy_multipart(client, bucket, k, dest_bucket, dest_key, size, storage_class, executor)
+            else:
+                _copy_multipart(client, bucket, k, dest_bucket, dest_key, size, storage_class, part_executor)
+        else:
+            copy_kwargs = {}
+            if storage_class:
+                copy_kwargs["StorageClass"] = storage_class
+            client.copy_object(
+                Bucket=dest_bucket,
+                Key=dest_key,
+                CopySource={"Bucket": bucket, "Key": k},
+                **copy_kwargs,
+            )
+    except Exception as e:
+        logger.error(f"Failed to copy {k}, error {e}")
+        return dest_key, False
+    logger.info(f"Copied ({count}) {k} to {dest_key}")
+    return dest_key, True
+
+
+def _iter_sources(client, bucket, prefix_key=None, keys_file: Path = None):
+    if keys_file:
+        logger.info(f"Reading keys list from {keys_file}")
+        for k in iter_keys_file(keys_file):
+            yield k, None, None
+    else:
+        for contents in iter_pages(client, bucket, prefix_key):
+            for i in contents:
+                if i["Key"][-1] != "/":
+                    yield i["Key"], i.get("Size"), i.get("StorageClass")
+
+
+def copy_bucket(
+    bucket,
+    dest_bucket,
+    client,
+    prefix_key: str = None,
+    dest_prefix: str = None,
+    keys_file: Path = None,
+    skip_existing=False,
+    max_workers=MAX_WORKERS,
+    storage_class=None,
+    max_part_workers=MAX_PART_WORKERS,
+):
+    """
+    params:
+    - bucket: source s3 bucket
+    - dest_bucket: destination s3 bucket (can be the same as source, see
+      ``check_copy_target``)
+    - client: initialized s3 client object, must have access to both buckets
+    - prefix_key: source prefix, replaced with dest_prefix in destination keys
+      (not used for listing if keys_file is specified)
+    - dest_prefix: prefix of destination keys
+    - keys_file: path to the file with list of S3 keys, nothing is copied
+      if it does not exist
+    - skip_existing: skip keys which already exist in destination with the same size
+    - storage_class: storage class of copies, source storage class by default
+    - max_part_workers: size of the pool shared by part copies of all
+      multipart objects
+
+    Object copies are submitted as others finish, so one big multipart copy
+    does not hold back the rest. ``max_workers + max_part_workers`` is
+    kept within ``MAX_POOL_CONNECTIONS`` of the client.
+
+    Return ``(copied, failed)`` counts.
+    """
+    check_copy_target(bucket, dest_bucket, prefix_key, dest_prefix, keys_file)
+    if keys_file and not Path(keys_file).is_file():
+        logger.error(f"Keys file {keys_file} does not exist, nothing to copy")
+        return 0, 0
+    if max_workers + max_part_workers > MAX_POOL_CONNECTIONS:
+        max_part_workers = max(1, MAX_POOL_CONNECTIONS - max_workers)
+        max_workers = min(max_workers, MAX_POOL_CONNECTIONS - max_part_workers)
+        logger.warning(
+            f"Limit to {max_workers} copy and {max_part_workers} part copy workers "
+            f"to fit {MAX_POOL_CONNECTIONS} connections"
+        )
+    copied = failed = 0
+
+    def tasks(part_executor):
+        sources = _iter_sources(client, bucket, prefix_key, keys_file)
+        for count, (k, size, source_storage_class) in enumerate(sources, 1):
+            dest_key = dest_key_for(k, prefix_key, dest_prefix)
+            yield dest_key, (
+                client,
+                bucket,
+                k,
+                dest_bucket,
+                dest_key,
+                count,
+                size,
+                skip_existing,
+                storage_class or source_storage_class,
+                part_executor,
+            )
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_part_workers) as part_executor:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for dest_key, future in iter_completed(
+                executor, copy_file, tasks(part_executor), max_workers * IN_FLIGHT_PER_WORKER
+            ):
+                _, is_copied = future.result()
+                if is_copied:
+                    copied += 1
+                else:
+                    failed += 1
+                    logger.error(f"Failed to copy object {dest_key}")
+    logger.info(f"Copied {copied} objects, failed {failed}")
+    return copied, failed
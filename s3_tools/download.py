@@ -0,0 +1,269 @@
+"""Download files from S3 bucket by prefix or by list of keys."""
+import concurrent.futures
+import logging
+import os
+import time
+from pathlib import Path
+
+from .pool import iter_completed
+
+logger = logging.getLogger("s3_downloading")
+
+MAX_WORKERS = 24
+# downloads submitted to the executor and not yet collected, per worker
+IN_FLIGHT_PER_WORKER = 4
+PROGRESS_EVERY = 10000
+
+
+def download_file(client, bucket, k, dest_pathname, count, total=None, skip_existing=False):
+    """Download single key, return ``(dest_pathname, is_file)``."""
+    if skip_existing and Path(dest_pathname).is_file():
+        try:
+            obj = client.head_object(Bucket=bucket, Key=k)
+            if (
+                obj["ResponseMetadata"]["HTTPStatusCode"] == 200
+                and obj.get("ContentLength") == Path(dest_pathname).stat().st_size
+            ):
+                logger.info(f"File {dest_pathname} already exists.")
+                return dest_pathname, Path(dest_pathname).is_file()
+        except Exception as e:
+            logger.error(f"While getting head object error was raised: {e}")
+    try:
+        client.download_file(bucket, k, dest_pathname)
+    except Exception as e:
+        logger.error(f"Failed to download {k}, error {e}")
+    if total:
+        logger.info(f"Downloaded {count}/{total} {dest_pathname}")
+    else:
+        logger.info(f"Downloaded {count} {dest_pathname}")
+
+    return dest_pathname, Path(dest_pathname).is_file()
+
+
+def makedirs(dirname, created):
+    """Create ``dirname`` unless it is in ``created`` set of folders made by this run."""
+    if dirname in created:
+        return
+    os.makedirs(dirname, exist_ok=True)
+    created.add(dirname)
+
+
+def iter_pages(client, bucket, prefix_key: str = None, delimiter: str = None):
+    """
+    Yield ``Contents`` of every ``list_objects_v2`` page for ``prefix_key``.
+
+    With ``delimiter`` only keys without it after the prefix are listed.
+    """
+    next_token = ""
+    base_kwargs = {
+        "Bucket": bucket,
+    }
+    if prefix_key:
+        base_kwargs["Prefix"] = prefix_key
+    if delimiter:
+        base_kwargs["Delimiter"] = delimiter
+    while next_token is not None:
+        kwargs = base_kwargs.copy()
+        if next_token != "":
+            kwargs.update({"ContinuationToken": next_token})
+        results = client.list_objects_v2(**kwargs)
+        next_token = results.get("NextContinuationToken")
+        yield results.get("Contents", [])
+
+
+def iter_keys_file(keys_file: Path):
+    """Yield not empty keys from ``keys_file`` (one key - one line)."""
+    with open(str(keys_file), "r") as f:
+        for k in f:
+            k = k.strip("\n")
+            if k:
+                yield k
+
+
+class FailedKeys(object):
+    """
+    Write keys which failed to download to ``path``, one key - one line.
+
+    The file has the keys file format so it can be passed back as
+    ``keys_file``. Keys are written to ``<path>.partial`` first and moved to
+    ``path`` on clean close, so the file being replayed is not truncated
+    while it is read. If nothing failed the stale ``path`` is removed
+    (unless it is the keys file being read). If the run is interrupted
+    ``path`` is left as is and failures so far stay in ``<path>.partial``.
+    """
+
+    def __init__(self, path, keys_file=None):
+        self.path = Path(path) if path else None
+        self._keys_file = Path(keys_file).resolve() if keys_file else None
+        self._partial = None
+        self._f = None
+        self.count = 0
+
+    def __enter__(self):
+        if self.path:
+            self._partial = self.path.with_name(self.path.name + ".partial")
+            self._f = open(str(self._partial), "w", buffering=1)
+        return self
+
+    def add(self, k):
+        self.count += 1
+        if self._f:
+            self._f.write(f"{k}\n")
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self._f:
+            return
+        self._f.close()
+        if exc_type is not None:
+            logger.error(
+                f"Interrupted, {self.path} is not changed, "
+                f"{self.count} keys failed so far are in {self._partial}"
+            )
+            return
+        if self.count:
+            os.replace(str(self._partial), str(self.path))
+            logger.error(f"{self.count} keys failed, replay them with --keys-file {self.path}")
+            return
+        os.remove(str(self._partial))
+        if self.path.is_file() and self.path.resolve() != self._keys_file:
+            os.remove(str(self.path))
+
+
+def _collect_result(k, future, failed_keys):
+    dest_pathname, is_file = future.result()
+    if not is_file:
+        failed_keys.add(k)
+        logger.error(f"Failed to download file {dest_pathname}")
+        return False
+    logger.info(f"Successfully downloaded {dest_pathname}")
+    return True
+
+
+def _collect_results(futures, failed_keys):
+    downloaded = failed = 0
+    for k, future in futures:
+        if _collect_result(k, future, failed_keys):
+            downloaded += 1
+        else:
+            failed += 1
+    return downloaded, failed
+
+
+def download_keys(local, bucket, client, keys_file: Path, skip_existing=False, max_workers=MAX_WORKERS, failed_keys_file: Path = None):
+    """
+    Download keys listed in ``keys_file`` (one key - one line) into ``local``.
+
+    Keys file is streamed with at most ``max_workers * IN_FLIGHT_PER_WORKER``
+    downloads pending, so memory does not depend on the number of keys.
+    Failed keys are written to ``failed_keys_file`` (see ``FailedKeys``).
+
+    Return ``(downloaded, failed)`` counts.
+    """
+    logger.info(f"Reading keys list from {keys_file}")
+    downloaded = failed = 0
+    created_dirs = set()
+    started = time.monotonic()
+
+    def tasks():
+        for count, k in enumerate(iter_keys_file(keys_file), 1):
+            dest_pathname = os.path.join(local, k)
+            makedirs(os.path.dirname(dest_pathname), created_dirs)
+            logger.info(f"Download file ({count}) {k}")
+            yield k, (client, bucket, k, dest_pathname, count, None, skip_existing)
+
+    with FailedKeys(failed_keys_file, keys_file) as failed_keys:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for k, future in iter_completed(
+                executor, download_file, tasks(), max_workers * IN_FLIGHT_PER_WORKER
+            ):
+                if _collect_result(k, future, failed_keys):
+                    downloaded += 1
+                else:
+                    failed += 1
+                if (downloaded + failed) % PROGRESS_EVERY == 0:
+                    logger.info(
+                        f"Done {downloaded + failed} keys, failed {failed}, "
+                        f"{(downloaded + failed) / (time.monotonic() - started):.1f} keys/s"
+                    )
+
+    logger.info(
+        f"Downloaded {downloaded} keys, failed {failed} in {time.monotonic() - started:.1f}s"
+    )
+    return downloaded, failed
+
+
+def download_prefix(local, bucket, client, prefix_key: str = None, skip_existing=False, max_workers=MAX_WORKERS, failed_keys_file: Path = None):
+    """
+    Download all keys matching ``prefix_key`` (whole bucket if empty) into ``local``.
+
+    Failed keys are written to ``failed_keys_file`` (see ``FailedKeys``).
+
+    Return ``(downloaded, failed)`` counts.
+    """
+    downloaded = failed = 0
+    created_dirs = set()
+    with FailedKeys(failed_keys_file) as failed_keys:
+        for t, contents in enumerate(iter_pages(client, bucket, prefix_key)):
+            logger.info(f"{t} thousands")
+            keys = []
+            dirs = []
+            for i in contents:
+                k = i.get("Key")
+                if k[-1] != "/":
+                    keys.append(k)
+                else:
+                    dirs.append(k)
+            for d in dirs:
+                makedirs(os.path.dirname(os.path.join(local, d)), created_dirs)
+
+            files_count = len(keys)
+            count = 1
+            data_files_download_results = []
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for k in keys:
+                    dest_pathname = os.path.join(local, k)
+                    makedirs(os.path.dirname(dest_pathname), created_dirs)
+                    logger.info(f"File {count}/{files_count + 1000 * t}")
+                    logger.info(f"Download file {k}")
+                    data_files_download_results.append(
+                        (
+                            k,
+                            executor.submit(
+                                download_file,
+                                client,
+                                bucket,
+                                k,
+                                dest_pathname,
+                                count,
+                                files_count,
+                                skip_existing,
+                            ),
+                        )
+                    )
+                    count += 1
+
+            page_downloaded, page_failed = _collect_results(data_files_download_results, failed_keys)
+            downloaded += page_downloaded
+            failed += page_failed
+    return downloaded, failed
+
+
+def download_bucket(local, bucket, client, prefix_key: str = None, keys_file: Path = None, skip_existing=False, max_workers=MAX_WORKERS, failed_keys_file: Path = None):
+    """
+    params:
+    - prefix_key: pattern to match in s3 (will be ignored if keys_file is specified)
+    - local: local path to folder in which to place files
+    - bucket: s3 bucket with target contents
+    - client: initialized s3 client object
+    - keys_file: path to the file with list of S3 keys, nothing is downloaded
+      if it does not exist
+    - skip_existing: skip files which already exist locally with the same size
+    - failed_keys_file: path to write keys which failed to download,
+      can be passed back as keys_file
+    """
+    if keys_file:
+        if not Path(keys_file).is_file():
+            logger.error(f"Keys file {keys_file} does not exist, nothing to download")
+            return 0, 0
+        return download_keys(local, bucket, client, keys_file, skip_existing, max_workers, failed_keys_file)
+    return download_prefix(local, bucket, client, prefix_key, skip_existing, max_workers, failed_keys_file)
@@ -0,0 +1,31 @@
+"""Logging setup used by the command line scripts."""
+import logging
+import sys
+
+FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+def setup_logger(name, log_file, errors_log_file):
+    """Attach stdout, log file and errors log file handlers to logger ``name``."""
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.DEBUG)
+    if logger.handlers:
+        return logger
+
+    formatter = logging.Formatter(FORMAT)
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setLevel(logging.DEBUG)
+    handler.setFormatter(formatter)
+
+    f_handler = logging.FileHandler(log_file)
+    f_handler.setFormatter(formatter)
+
+    e_handler = logging.FileHandler(errors_log_file)
+    e_handler.setLevel(logging.ERROR)
+    e_handler.setFormatter(formatter)
+
+    logger.addHandler(e_handler)
+    logger.addHandler(handler)
+    logger.addHandler(f_handler)
+    return logger
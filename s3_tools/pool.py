@@ -0,0 +1,24 @@
+"""Bounded submission of work to thread pools."""
+import concurrent.futures
+
+
+def iter_completed(executor, fn, tasks, max_in_flight):
+    """
+    Submit ``fn(*args)`` for every ``(tag, args)`` of ``tasks``, yield ``(tag, future)`` as they finish.
+
+    At most ``max_in_flight`` futures are pending at once, ``tasks`` is only
+    consumed when there is room, so it can be a lazy generator over
+    millions of items. One slow task does not stop the others, the next
+    task is submitted as soon as any pending one finishes.
+    """
+    pending = {}
+    for tag, args in tasks:
+        pending[executor.submit(fn, *args)] = tag
+        if len(pending) >= max_in_flight:
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                yield pending.pop(future), future
+    for future in concurrent.futures.as_completed(list(pending)):
+        yield pending.pop(future), future
@@ -0,0 +1,197 @@
+"""Upload files and folders to S3 bucket."""
+import concurrent.futures
+import functools
+import glob
+import logging
+import mimetypes
+import os
+import sys
+import threading
+from pathlib import Path
+
+logger = logging.getLogger("s3_uploading")
+
+MAX_WORKERS = 24
+BATCH_SIZE = 10000
+
+
+class ProgressPercentage(object):
+    def __init__(self, filename):
+        self._filename = filename
+        self._size = float(os.path.getsize(filename))
+        self._seen_so_far = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, bytes_amount):
+        # To simplify we'll assume this is hooked up
+        # to a single filename.
+        with self._lock:
+            self._seen_so_far += bytes_amount
+            percentage = (self._seen_so_far / self._size) * 100
+            sys.stdout.write(
+                "\r%s  %s / %s  (%.2f%%)"
+                % (self._filename, self._seen_so_far, self._size, percentage)
+            )
+            sys.stdout.flush()
+
+
+@functools.lru_cache(maxsize=None)
+def _with_retries(func):
+    # backoff and urllib3 are imported here and not on module import
+    import backoff
+    from urllib3.exceptions import MaxRetryError
+
+    return backoff.on_exception(
+        backoff.expo, (ValueError, MaxRetryError, ConnectionError), max_tries=5
+    )(func)
+
+
+def is_uploaded(client, bucket, key, path):
+    """Check if object ``key`` exists and has the same size as local ``path``."""
+    try:
+        obj = client.head_object(Bucket=bucket, Key=key)
+    except Exception:
+        return False
+    return (
+        obj["ResponseMetadata"]["HTTPStatusCode"] == 200
+        and obj.get("ContentLength") == Path(path).stat().st_size
+    )
+
+
+def _upload_file(
+    client,
+    bucket,
+    path,
+    key,
+    count,
+    total_count=None,
+    guess_type=False,
+    storage_class=None,
+    max_concurrency=5,
+    remove_file=False,
+    check_existing=True,
+):
+    from boto3.s3.transfer import TransferConfig
+
+    config = TransferConfig(
+        multipart_threshold=1024 * 1024,
+        max_concurrency=max_concurrency,
+        multipart_chunksize=1024 * 1024,
+        use_threads=True,
+    )
+    message = ""
+    if check_existing and is_uploaded(client, bucket, key, path):
+        message = f"Object with key {key} exist skipping.."
+        logger.info(message)
+        return key, False, message
+    extra_args = {}
+    if storage_class:
+        extra_args["StorageClass"] = storage_class
+    if guess_type:
+        mimetype = mimetypes.guess_type(path)
+        if mimetype and mimetype[0]:
+            extra_args["ContentType"] = mimetype[0]
+            if mimetype[0] == "text/html":
+                logger.info(f"Set ContentDisposition: inline for {path}")
+                extra_args["ContentDisposition"] = "inline"
+    client.upload_file(
+        path,
+        bucket,
+        key,
+        Config=config,
+        # Callback=ProgressPercentage(path),
+        ExtraArgs=extra_args,
+    )
+    if total_count:
+        logger.info(f"Uploaded ({count}/{total_count}) {path}")
+    else:
+        logger.info(f"Uploaded ({count}) {path}")
+    if remove_file:
+        os.remove(str(path))
+    return key, True, message
+
+
+def upload_file(client, bucket, path, key, count, total_count=None, guess_type=False, storage_class=None, max_concurrency=5, remove_file=False, check_existing=True):
+    """
+    Upload local file ``path`` with ``key``, return ``(key, uploaded, message)``.
+
+    Upload is skipped if object with the same key and size already exists,
+    pass ``check_existing=False`` if the caller has already checked it.
+    """
+    return _with_retries(_upload_file)(
+        client,
+        bucket,
+        path,
+        key,
+        count,
+        total_count,
+        guess_type,
+        storage_class,
+        max_concurrency,
+        remove_file,
+        check_existing,
+    )
+
+
+def _upload_batch(client, bucket, folder_path, files_to_upload, uploaded_count, guess_type, max_workers):
+    data_files_upload_results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for file_path_to_upload in files_to_upload:
+            file_path_to_upload = Path(file_path_to_upload)
+            related_file_path = file_path_to_upload.relative_to(folder_path)
+            s3_key = str(related_file_path)
+            logger.info(f"Uploading file {file_path_to_upload} with key {s3_key}")
+            data_files_upload_results.append(
+                executor.submit(
+                    upload_file,
+                    client,
+                    bucket,
+                    str(file_path_to_upload),
+                    s3_key,
+                    uploaded_count,
+                    guess_type=guess_type,
+                )
+            )
+            uploaded_count += 1
+    for future in data_files_upload_results:
+        key, uploaded, message = future.result()
+        if not uploaded:
+            logger.error(f"Failed to upload file {key}, {message}")
+        else:
+            logger.info(f"Successfully uploaded {key}")
+    return uploaded_count
+
+
+def upload_tree(folder_path: Path, bucket, client, prefix_path: str = None, guess_type=False, max_workers=MAX_WORKERS):
+    """
+    Upload all files from ``folder_path`` (or its ``prefix_path`` subfolder) recursively.
+
+    Keys are file paths relative to ``folder_path``. Return count of walked paths.
+    """
+    folder_path = Path(folder_path)
+    if prefix_path:
+        final_path = folder_path / prefix_path
+    else:
+        final_path = folder_path
+    count = 0
+    uploaded_count = 1
+    files_to_upload = []
+
+    for file_path in glob.iglob(str(final_path / "**"), recursive=True):
+        count += 1
+        if not Path(file_path).is_file():
+            continue
+        files_to_upload.append(file_path)
+        if count % BATCH_SIZE == 0:
+            uploaded_count = _upload_batch(
+                client, bucket, folder_path, files_to_upload, uploaded_count, guess_type, max_workers
+            )
+            files_to_upload = []
+            logger.info(f'Total uploaded {count} files')
+
+    # files_to_upload could have files which was not uploaded because count % BATCH_SIZE != 0
+    _upload_batch(
+        client, bucket, folder_path, files_to_upload, uploaded_count, guess_type, max_workers
+    )
+    logger.info(f'Total uploaded {count} files')
+    return count
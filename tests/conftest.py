@@ -0,0 +1,141 @@
+import itertools
+import sys
+import threading
+
+import pytest
+
+
+class StubClient(object):
+    """In-memory stand-in for boto3 S3 client, one bucket per name."""
+
+    def __init__(self, objects=None, page_size=1000):
+        self.buckets = {}
+        for (bucket, key), body in (objects or {}).items():
+            self.put(bucket, key, body)
+        self.page_size = page_size
+        self.calls = []
+        self._uploads = {}
+        self._upload_ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def put(self, bucket, key, body, **headers):
+        self.buckets.setdefault(bucket, {})[key] = {"Body": body, **headers}
+
+    def body(self, bucket, key):
+        return self.buckets[bucket][key]["Body"]
+
+    def _call(self, name, **kwargs):
+        with self._lock:
+            self.calls.append((name, kwargs))
+
+    def _get(self, bucket, key):
+        try:
+            return self.buckets[bucket][key]
+        except KeyError:
+            raise Exception("An error occurred (404) when calling the HeadObject operation: Not Found")
+
+    def list_objects_v2(self, Bucket, Prefix="", Delimiter=None, ContinuationToken=None):
+        self._call("list_objects_v2", Bucket=Bucket, Prefix=Prefix)
+        keys = sorted(
+            k
+            for k in self.buckets.get(Bucket, {})
+            if k.startswith(Prefix) and not (Delimiter and Delimiter in k[len(Prefix):])
+        )
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + self.page_size]
+        results = {"KeyCount": len(page)}
+        if page:
+            results["Contents"] = [
+                {
+                    "Key": k,
+                    "Size": len(self.buckets[Bucket][k]["Body"]),
+                    "StorageClass": self.buckets[Bucket][k].get("StorageClass", "STANDARD"),
+                }
+                for k in page
+            ]
+        if start + self.page_size < len(keys):
+            results["NextContinuationToken"] = str(start + self.page_size)
+        return results
+
+    def head_object(self, Bucket, Key):
+        self._call("head_object", Bucket=Bucket, Key=Key)
+        obj = self._get(Bucket, Key)
+        headers = {k: v for k, v in obj.items() if k != "Body"}
+        return {
+            "ResponseMetadata": {"HTTPStatusCode": 200},
+            "ContentLength": len(obj["Body"]),
+            **headers,
+        }
+
+    def download_file(self, bucket, key, dest_pathname):
+        self._call("download_file", Bucket=bucket, Key=key)
+        body = self._get(bucket, key)["Body"]
+        with open(dest_pathname, "wb") as f:
+            f.write(body)
+
+    def upload_file(self, path, bucket, key, Config=None, ExtraArgs=None):
+        self._call("upload_file", Bucket=bucket, Key=key)
+        with open(path, "rb") as f:
+            self.put(bucket, key, f.read(), **(ExtraArgs or {}))
+
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        self._call("copy_object", Bucket=Bucket, Key=Key, CopySource=CopySource, **kwargs)
+        source = self._get(CopySource["Bucket"], CopySource["Key"])
+        # like S3, headers are copied but storage class is not
+        headers = {k: v for k, v in source.items() if k not in ("Body", "StorageClass")}
+        headers.update(kwargs)
+        self.put(Bucket, Key, source["Body"], **headers)
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self._call("create_multipart_upload", Bucket=Bucket, Key=Key, **kwargs)
+        with self._lock:
+            upload_id = str(next(self._upload_ids))
+            self._uploads[upload_id] = {"parts": {}, "headers": kwargs}
+        return {"UploadId": upload_id}
+
+    def upload_part_copy(self, Bucket, Key, UploadId, PartNumber, CopySource, CopySourceRange):
+        self._call("upload_part_copy", PartNumber=PartNumber, CopySourceRange=CopySourceRange)
+        first, last = map(int, CopySourceRange[len("bytes="):].split("-"))
+        body = self._get(CopySource["Bucket"], CopySource["Key"])["Body"]
+        self._uploads[UploadId]["parts"][PartNumber] = body[first:last + 1]
+        return {"CopyPartResult": {"ETag": f"etag-{PartNumber}"}}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self._call("complete_multipart_upload", Bucket=Bucket, Key=Key)
+        upload = self._uploads.pop(UploadId)
+        body = b"".join(upload["parts"][p["PartNumber"]] for p in MultipartUpload["Parts"])
+        self.put(Bucket, Key, body, **upload["headers"])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self._call("abort_multipart_upload", Bucket=Bucket, Key=Key)
+        self._uploads.pop(UploadId, None)
+
+
+@pytest.fixture
+def stub_client():
+    return StubClient
+
+
+@pytest.fixture
+def fake_7z(tmp_path, monkeypatch):
+    """
+    Leave only fake ``7z`` on PATH, call the fixture to install it.
+
+    Fake writes small archive (like 7z does before failing) and exits with
+    given code. If not installed ``7z`` is missing.
+    """
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    monkeypatch.setenv("PATH", str(bin_dir))
+
+    def install(returncode=0):
+        script = bin_dir / "7z"
+        script.write_text(
+            f"#!{sys.executable}\n"
+            "import sys\n"
+            "open(sys.argv[3], 'wb').write(b'7z' * 10)\n"
+            f"sys.exit({returncode})\n"
+        )
+        script.chmod(0o755)
+
+    return install
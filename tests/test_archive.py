@@ -0,0 +1,171 @@
+import json
+import os
+import subprocess
+
+import pytest
+
+from s3_tools import archive, codecs
+from s3_tools.archive import archive_and_upload, compress_folder, existing_keys, plan_jobs
+
+
+@pytest.fixture
+def src(tmp_path):
+    folder = tmp_path / "src" / "photos"
+    folder.mkdir(parents=True)
+    (folder / "a.txt").write_text("lorem ipsum " * 1000)
+    tmp_folder = tmp_path / "tmp"
+    tmp_folder.mkdir()
+    return folder, tmp_folder
+
+
+@pytest.mark.parametrize("returncode", [2, 8, 255])
+def test_fatal_7z_error_raises_and_removes_archive(src, fake_7z, returncode):
+    folder, tmp_folder = src
+    fake_7z(returncode)
+
+    with pytest.raises(subprocess.CalledProcessError):
+        compress_folder(folder, tmp_folder)
+    assert list(tmp_folder.iterdir()) == []
+
+
+def test_7z_warning_is_not_fatal(src, fake_7z):
+    folder, tmp_folder = src
+    fake_7z(1)
+
+    assert compress_folder(folder, tmp_folder) == tmp_folder / "photos.7z"
+
+
+def test_failed_archive_is_not_uploaded(src, monkeypatch, stub_client, fake_7z):
+    folder, tmp_folder = src
+    fake_7z(2)
+    uploads = []
+    monkeypatch.setattr(archive, "upload_file", lambda *args, **kwargs: uploads.append(args))
+
+    archive_and_upload(folder.parent, tmp_folder, "b", stub_client())
+
+    assert uploads == []
+
+
+def test_adaptive_without_7z_uploads_tar(src, monkeypatch, stub_client, fake_7z):
+    folder, tmp_folder = src
+    (folder / "a.txt").write_bytes(os.urandom(100000))
+    uploads = []
+    monkeypatch.setattr(archive, "upload_file", lambda client, bucket, path, key, *args, **kwargs: uploads.append(key))
+
+    archive_and_upload(folder.parent, tmp_folder, "b", stub_client(), adaptive=True)
+
+    assert uploads == ["photos.tar"]
+
+
+def test_stats_record_names_throughput(src, tmp_path):
+    folder, tmp_folder = src
+    stats_file = tmp_path / "stats.jsonl"
+
+    archive_path = compress_folder(
+        folder, tmp_folder, codec=codecs.TarCodec("tar-gz-1", "gz", 1), stats_file=stats_file
+    )
+
+    record = json.loads(stats_file.read_text())
+    assert archive_path.name == "photos.tar.gz"
+    assert record["codec"] == "tar-gz-1"
+    assert "wall_mbps" in record and "mbps" not in record
+
+
+def test_choose_codec_records_cpu_throughput(src):
+    folder, tmp_folder = src
+    gz = codecs.TarCodec("tar-gz-1", "gz", 1)
+
+    codec, results = codecs.choose_codec(folder, tmp_folder, candidates=[gz], min_mbps=0)
+
+    assert codec is gz
+    assert set(results[0]) == {"codec", "ratio", "cpu_seconds", "cpu_mbps"}
+
+
+def _calls(client, name):
+    return [kwargs for call, kwargs in client.calls if call == name]
+
+
+def test_existing_keys_lists_root_and_prefix_level(stub_client):
+    client = stub_client(
+        {
+            ("b", "a.7z"): b"1",
+            ("b", "deep/b.7z"): b"1",
+            ("b", "sub/f.txt"): b"22",
+            ("b", "sub/deeper/g.txt"): b"1",
+        }
+    )
+
+    assert existing_keys(client, "b", "sub") == {"a.7z": 1, "sub/f.txt": 2}
+    assert [kwargs["Prefix"] for kwargs in _calls(client, "list_objects_v2")] == ["", "sub/"]
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "root"
+    for name, size in (("small", 10), ("big", 1000), ("archived", 500)):
+        (root / name).mkdir(parents=True)
+        (root / name / "data").write_bytes(b"x" * size)
+    (root / "same.txt").write_bytes(b"y" * 5)
+    (root / "changed.txt").write_bytes(b"y" * 50)
+    tmp_folder = tmp_path / "tmp"
+    tmp_folder.mkdir()
+    return root, tmp_folder
+
+
+def test_plan_jobs_skips_existing_and_orders_largest_first(tree):
+    root, _ = tree
+    keys = {"archived.tar.gz": 7, "same.txt": 5, "changed.txt": 1}
+
+    jobs = plan_jobs(root, root, keys, [".7z", ".tar", ".tar.gz"])
+
+    assert [(job.path.name, job.size, job.is_dir) for job in jobs] == [
+        ("big", 1000, True),
+        ("changed.txt", 50, False),
+        ("small", 10, True),
+    ]
+
+
+def test_plan_jobs_matches_only_given_suffixes(tree):
+    root, _ = tree
+
+    jobs = plan_jobs(root, root, {"archived.tar.gz": 7}, [".7z"])
+
+    assert "archived" in [job.path.name for job in jobs]
+
+
+def test_archive_and_upload_plans_from_one_listing(tree, stub_client, fake_7z):
+    root, tmp_folder = tree
+    fake_7z()
+    client = stub_client({("b", "archived.7z"): b"7z", ("b", "same.txt"): b"y" * 5})
+
+    archive_and_upload(root, tmp_folder, "b", client)
+
+    assert _calls(client, "head_object") == []
+    assert len(_calls(client, "list_objects_v2")) == 1
+    # largest first
+    assert [kwargs["Key"] for kwargs in _calls(client, "upload_file")] == ["big.7z", "changed.txt", "small.7z"]
+    assert client.buckets["b"]["big.7z"]["StorageClass"] == "DEEP_ARCHIVE"
+    assert list(tmp_folder.iterdir()) == []
+    assert (root / "changed.txt").is_file()
+
+    client.calls.clear()
+    archive_and_upload(root, tmp_folder, "b", client)
+
+    assert _calls(client, "upload_file") == []
+    assert _calls(client, "head_object") == []
+
+
+def test_adaptive_run_finds_archives_with_any_suffix(tree, stub_client, fake_7z):
+    root, tmp_folder = tree
+    client = stub_client(
+        {
+            ("b", "big.tar.gz"): b"1",
+            ("b", "small.tar"): b"1",
+            ("b", "archived.7z"): b"1",
+            ("b", "same.txt"): b"y" * 5,
+        }
+    )
+
+    archive_and_upload(root, tmp_folder, "b", client, adaptive=True)
+
+    assert [kwargs["Key"] for kwargs in _calls(client, "upload_file")] == ["changed.txt"]
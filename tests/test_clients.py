@@ -0,0 +1,83 @@
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+from s3_tools import clients
+from s3_tools.clients import endpoint_url, get_client
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_import_does_not_load_heavy_modules():
+    code = (
+        "import sys\n"
+        "import s3_tools, s3_tools.copy, s3_tools.archive, s3_tools.codecs\n"
+        "print(sorted(m for m in ('boto3', 'botocore', 'backoff', 'urllib3') if m in sys.modules))\n"
+    )
+    output = subprocess.check_output([sys.executable, "-c", code], cwd=str(ROOT))
+
+    assert output.decode().strip() == "[]"
+
+
+@pytest.mark.parametrize("script", ["download_bucket.py", "folder_to_s3.py", "folder_to_s3_7z.py", "copy_bucket.py"])
+def test_script_help_does_not_load_boto3(script):
+    code = (
+        "import runpy, sys\n"
+        f"sys.argv = [{script!r}, '--help']\n"
+        "try:\n"
+        f"    runpy.run_path({script!r}, run_name='__main__')\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print('boto3' in sys.modules, file=sys.stderr)\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=str(ROOT), capture_output=True)
+
+    assert result.stderr.decode().strip() == "False"
+
+
+@pytest.fixture
+def empty_cache(monkeypatch):
+    pytest.importorskip("boto3")
+    monkeypatch.setattr(clients, "_clients", {})
+
+
+def test_get_client_is_cached_per_credentials(empty_cache):
+    client = get_client("key", "secret", "https://s3.example.com")
+
+    assert get_client("key", "secret", "https://s3.example.com") is client
+    assert get_client("other", "secret", "https://s3.example.com") is not client
+    assert get_client("key", "secret", "https://other.example.com") is not client
+    assert client.meta.config.max_pool_connections == clients.MAX_POOL_CONNECTIONS
+
+
+def test_get_client_creates_one_client_for_concurrent_callers(empty_cache):
+    results = []
+    barrier = threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        results.append(get_client("key", "secret", "https://s3.example.com"))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(client) for client in results}) == 1
+
+
+@pytest.mark.parametrize(
+    "endpoint, expected",
+    [
+        (None, None),
+        ("", None),
+        ("s3.example.com", "https://s3.example.com"),
+        ("http://localhost:9000", "http://localhost:9000"),
+    ],
+)
+def test_endpoint_url(endpoint, expected):
+    assert endpoint_url(endpoint) == expected
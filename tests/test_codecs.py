@@ -0,0 +1,151 @@
+import os
+import subprocess
+import sys
+import tarfile
+import threading
+
+import pytest
+
+from s3_tools import codecs
+from s3_tools.codecs import STORE, TAR_STORE, TarCodec, choose_codec, sample_folder
+
+
+class FakeCodec(object):
+    """Codec with fixed compressed share of the sample and CPU seconds."""
+
+    suffix = ".fake"
+
+    def __init__(self, name, share, cpu):
+        self.name = name
+        self.share = share
+        self.cpu = cpu
+
+    def compress_sample(self, data, tmp_folder):
+        return int(len(data) * self.share), self.cpu
+
+
+class FailingCodec(FakeCodec):
+    def compress_sample(self, data, tmp_folder):
+        raise FileNotFoundError("No such file or directory: '7z'")
+
+
+@pytest.fixture
+def folder(tmp_path):
+    folder = tmp_path / "photos"
+    folder.mkdir()
+    (folder / "a.bin").write_bytes(os.urandom(2 * 1024 * 1024))
+    return folder
+
+
+def test_choose_codec_drops_slow_codecs(folder, tmp_path):
+    # sample is 256KiB of one file: "good" saves more per CPU second but
+    # runs at 4.2 MB per CPU second, "fast" at 21
+    good = FakeCodec("good", 0.0, 0.0625)
+    fast = FakeCodec("fast", 0.9, 0.0125)
+
+    assert choose_codec(folder, tmp_path, [good, fast], min_mbps=20)[0] is fast
+    assert choose_codec(folder, tmp_path, [good, fast], min_mbps=1)[0] is good
+
+
+def test_choose_codec_prefers_bytes_saved_per_cpu_second(folder, tmp_path):
+    small = FakeCodec("small", 0.9, 0.01)
+    big = FakeCodec("big", 0.2, 0.02)
+
+    assert choose_codec(folder, tmp_path, [small, big], min_mbps=1)[0] is big
+
+
+def test_choose_codec_falls_back_to_store_below_min_savings(folder, tmp_path, monkeypatch):
+    poor = FakeCodec("poor", 0.97, 0.01)
+    monkeypatch.setattr(STORE, "compress_sample", lambda data, tmp_folder: (len(data), 0.01))
+
+    codec, results = choose_codec(folder, tmp_path, [STORE, TAR_STORE, poor], min_mbps=1, min_savings=0.05)
+
+    assert codec is STORE
+    assert [result["codec"] for result in results] == ["7z-store", "tar", "poor"]
+
+
+def test_choose_codec_falls_back_to_tar_if_7z_fails(folder, tmp_path, fake_7z):
+    # fake_7z is not installed, so 7z is missing from PATH
+    candidates = [STORE, FakeCodec("poor", 0.99, 0.01), codecs.LZMA2_9]
+
+    codec, results = choose_codec(folder, tmp_path, candidates, min_mbps=1)
+
+    assert codec is TAR_STORE
+    assert [result["codec"] for result in results] == ["poor"]
+
+
+def test_choose_codec_without_7z_still_compresses(tmp_path, fake_7z):
+    folder = tmp_path / "docs"
+    folder.mkdir()
+    (folder / "a.txt").write_text("lorem ipsum " * 100000)
+
+    codec, _ = choose_codec(folder, tmp_path, min_mbps=1)
+
+    assert isinstance(codec, TarCodec) and codec.compression
+
+
+def test_choose_codec_all_failed(folder, tmp_path):
+    assert choose_codec(folder, tmp_path, [FailingCodec("7z", 0, 0)])[0] is TAR_STORE
+
+
+def test_choose_codec_empty_folder(tmp_path):
+    (tmp_path / "empty").mkdir()
+
+    assert choose_codec(tmp_path / "empty", tmp_path) == (TAR_STORE, [])
+
+
+def test_sample_folder_takes_files_with_stride(tmp_path):
+    for i in range(100):
+        (tmp_path / f"{i:03}.txt").write_bytes(bytes([i]) * 2000)
+
+    sample = sample_folder(tmp_path, sample_bytes=10000, file_bytes=1000)
+
+    # 100 files * 1000 readable bytes / 10000 sample bytes -> every 10th file
+    assert sample == b"".join(bytes([i]) * 1000 for i in range(0, 100, 10))
+
+
+def test_sample_folder_reads_all_small_folder(tmp_path):
+    (tmp_path / "a").write_bytes(b"a" * 10)
+    (tmp_path / "b").write_bytes(b"b" * 10)
+
+    assert sample_folder(tmp_path, sample_bytes=1000, file_bytes=5) == b"aaaaabbbbb"
+
+
+def test_tar_codec_roundtrip(tmp_path):
+    folder = tmp_path / "docs"
+    folder.mkdir()
+    (folder / "a.txt").write_text("hello")
+
+    for codec in (TAR_STORE, TarCodec("tar-xz-1", "xz", 1)):
+        archive_path = tmp_path / f"docs{codec.suffix}"
+        codec.compress_folder(folder, archive_path)
+        with tarfile.open(str(archive_path)) as tar:
+            assert tar.extractfile("docs/a.txt").read() == b"hello"
+
+
+def test_7z_cpu_is_measured_for_child_only():
+    busy = [sys.executable, "-c", "sum(range(3 * 10 ** 6))"]
+
+    cpu = codecs.SevenZipCodec._run(busy)
+
+    assert 0 < cpu < 5
+    with pytest.raises(subprocess.CalledProcessError):
+        codecs.SevenZipCodec._run([sys.executable, "-c", "import sys; sys.exit(2)"])
+
+
+def test_tar_cpu_excludes_other_threads(tmp_path):
+    stop = threading.Event()
+
+    def spin():
+        while not stop.is_set():
+            sum(range(1000))
+
+    thread = threading.Thread(target=spin)
+    thread.start()
+    try:
+        _, cpu = TAR_STORE.compress_sample(b"x" * 1000, tmp_path)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert cpu < 0.01
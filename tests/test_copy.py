@@ -0,0 +1,198 @@
+import threading
+import time
+
+import pytest
+
+from s3_tools import copy
+from s3_tools.copy import check_copy_target, copy_bucket, dest_key_for, part_ranges
+
+HEADERS = {
+    "ContentType": "video/mp4",
+    "ContentDisposition": "inline",
+    "ContentEncoding": "identity",
+    "CacheControl": "max-age=60",
+    "Metadata": {"owner": "scripts"},
+    "StorageClass": "DEEP_ARCHIVE",
+}
+
+
+@pytest.mark.parametrize(
+    "key, prefix_key, dest_prefix, expected",
+    [
+        ("a/b/c.txt", "a/", "x/", "x/b/c.txt"),
+        ("a/b/c.txt", None, "x/", "x/a/b/c.txt"),
+        ("a/b/c.txt", "a/", None, "b/c.txt"),
+        ("other/c.txt", "a/", "x/", "x/other/c.txt"),
+    ],
+)
+def test_dest_key_for(key, prefix_key, dest_prefix, expected):
+    assert dest_key_for(key, prefix_key, dest_prefix) == expected
+
+
+@pytest.mark.parametrize("size, part_size", [(1, 10), (10, 10), (11, 10), (1000, 7)])
+def test_part_ranges_cover_object(size, part_size):
+    ranges = part_ranges(size, part_size)
+
+    assert [number for number, _, _ in ranges] == list(range(1, len(ranges) + 1))
+    assert ranges[0][1] == 0
+    assert ranges[-1][2] == size - 1
+    for (_, _, last), (_, first, _) in zip(ranges, ranges[1:]):
+        assert first == last + 1
+    assert all(last - first + 1 <= part_size for _, first, last in ranges)
+
+
+def test_part_ranges_respect_max_parts():
+    size = 5 * 1024 ** 4
+    ranges = part_ranges(size, 5 * 1024 ** 2)
+
+    assert len(ranges) <= copy.MAX_PARTS
+    assert ranges[-1][2] == size - 1
+
+
+@pytest.mark.parametrize(
+    "prefix_key, dest_prefix",
+    [("a/", "a/"), ("a/", "a/x/"), ("a/x/", "a/"), (None, None), ("foo/", None), (None, "x/")],
+)
+def test_check_copy_target_rejects_overlap_in_same_bucket(prefix_key, dest_prefix):
+    with pytest.raises(ValueError):
+        check_copy_target("b", "b", prefix_key, dest_prefix)
+
+
+@pytest.mark.parametrize(
+    "bucket, dest_bucket, prefix_key, dest_prefix, keys_file",
+    [
+        ("b", "b", "a/", "x/", None),
+        ("b", "c", None, None, None),
+        ("b", "c", "a/", "a/", None),
+        ("b", "b", None, "x/", "keys.txt"),
+    ],
+)
+def test_check_copy_target_allows(bucket, dest_bucket, prefix_key, dest_prefix, keys_file):
+    check_copy_target(bucket, dest_bucket, prefix_key, dest_prefix, keys_file)
+
+
+def test_copy_bucket_rejects_nested_prefix_before_listing(stub_client):
+    client = stub_client({("b", f"a/{i}"): b"x" for i in range(5)})
+
+    with pytest.raises(ValueError):
+        copy_bucket("b", "b", client, "a/", "a/x/")
+    assert client.calls == []
+
+
+def test_copy_bucket_copies_prefix(stub_client):
+    client = stub_client({("b", f"a/{i}"): bytes([i]) * i for i in range(1, 30)}, page_size=7)
+
+    assert copy_bucket("b", "c", client, "a/", "x/", max_workers=4) == (29, 0)
+    assert client.buckets["c"] == {f"x/{i}": {"Body": bytes([i]) * i, "StorageClass": "STANDARD"} for i in range(1, 30)}
+
+
+@pytest.mark.parametrize("threshold", [1024, 10])
+def test_copy_keeps_headers_and_storage_class(stub_client, monkeypatch, threshold):
+    monkeypatch.setattr(copy, "MULTIPART_THRESHOLD", threshold)
+    monkeypatch.setattr(copy, "PART_SIZE", 7)
+    client = stub_client()
+    body = bytes(range(100))
+    client.put("b", "a/video.mp4", body, **HEADERS)
+
+    assert copy_bucket("b", "c", client, "a/", "x/") == (1, 0)
+    assert client.buckets["c"]["x/video.mp4"] == {"Body": body, **HEADERS}
+    if threshold < len(body):
+        assert sum(1 for name, _ in client.calls if name == "upload_part_copy") == 15
+
+
+def test_copy_storage_class_override(stub_client):
+    client = stub_client()
+    client.put("b", "a/1", b"1", StorageClass="DEEP_ARCHIVE")
+
+    copy_bucket("b", "c", client, "a/", storage_class="STANDARD_IA")
+
+    assert client.buckets["c"]["1"]["StorageClass"] == "STANDARD_IA"
+
+
+def test_copy_keys_file_uses_head_for_size(tmp_path, stub_client):
+    client = stub_client({("b", "a/1"): b"1"})
+    client.put("b", "a/2", b"22", StorageClass="GLACIER")
+    keys_file = tmp_path / "keys.txt"
+    keys_file.write_text("a/1\na/2\nmissing\n")
+
+    assert copy_bucket("b", "b", client, None, "copy/", keys_file=keys_file) == (2, 1)
+    assert client.buckets["b"]["copy/a/2"] == {"Body": b"22", "StorageClass": "GLACIER"}
+    assert not any(name == "list_objects_v2" for name, _ in client.calls)
+
+
+def test_copy_skip_existing(stub_client):
+    client = stub_client({("b", "a/1"): b"1", ("b", "a/2"): b"22", ("c", "1"): b"1", ("c", "2"): b"x"})
+
+    assert copy_bucket("b", "c", client, "a/", skip_existing=True) == (2, 0)
+    assert [kwargs["Key"] for name, kwargs in client.calls if name == "copy_object"] == ["2"]
+
+
+def test_copy_bucket_missing_keys_file(tmp_path, stub_client):
+    client = stub_client({("b", "a/1"): b"1"})
+
+    assert copy_bucket("b", "c", client, keys_file=tmp_path / "nope.txt") == (0, 0)
+    assert client.calls == []
+
+
+def test_big_copy_does_not_hold_back_others(stub_client):
+    keys = [f"a/{i:05}" for i in range(2500)]
+    client = stub_client({("b", k): b"x" for k in keys + ["a/big"]})
+    others_done = threading.Event()
+    copy_object = client.copy_object
+    copied = []
+
+    def slow_copy_object(Bucket, Key, CopySource, **kwargs):
+        if Key == "big":
+            # finishes only after every other object was copied
+            assert others_done.wait(timeout=10)
+        copy_object(Bucket=Bucket, Key=Key, CopySource=CopySource, **kwargs)
+        copied.append(Key)
+        if len(copied) == len(keys):
+            others_done.set()
+
+    client.copy_object = slow_copy_object
+
+    assert copy_bucket("b", "c", client, "a/", max_workers=4) == (2501, 0)
+    assert copied[-1] == "big"
+
+
+def _count_concurrent_parts(client):
+    upload_part_copy = client.upload_part_copy
+    lock = threading.Lock()
+    state = {"running": 0, "max": 0}
+
+    def counting_upload_part_copy(**kwargs):
+        with lock:
+            state["running"] += 1
+            state["max"] = max(state["max"], state["running"])
+        time.sleep(0.002)
+        try:
+            return upload_part_copy(**kwargs)
+        finally:
+            with lock:
+                state["running"] -= 1
+
+    client.upload_part_copy = counting_upload_part_copy
+    return state
+
+
+def test_part_copies_share_one_pool(stub_client, monkeypatch):
+    monkeypatch.setattr(copy, "MULTIPART_THRESHOLD", 10)
+    monkeypatch.setattr(copy, "PART_SIZE", 10)
+    client = stub_client({("b", f"a/{i}"): bytes(100) for i in range(8)})
+    state = _count_concurrent_parts(client)
+
+    assert copy_bucket("b", "c", client, "a/", max_workers=8, max_part_workers=3) == (8, 0)
+    assert state["max"] == 3
+    assert all(client.body("c", f"{i}") == bytes(100) for i in range(8))
+
+
+def test_workers_fit_connection_pool(stub_client, monkeypatch):
+    monkeypatch.setattr(copy, "MULTIPART_THRESHOLD", 10)
+    monkeypatch.setattr(copy, "PART_SIZE", 10)
+    monkeypatch.setattr(copy, "MAX_POOL_CONNECTIONS", 6)
+    client = stub_client({("b", f"a/{i}"): bytes(100) for i in range(8)})
+    state = _count_concurrent_parts(client)
+
+    assert copy_bucket("b", "c", client, "a/", max_workers=4, max_part_workers=8) == (8, 0)
+    assert state["max"] <= 2
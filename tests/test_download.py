@@ -0,0 +1,123 @@
+import shutil
+
+import pytest
+
+from s3_tools import download
+from s3_tools.download import FailedKeys, download_bucket, download_keys
+
+
+def _keys_file(path, keys):
+    path.write_text("".join(f"{k}\n" for k in keys))
+    return path
+
+
+def test_download_keys_writes_failed_keys_for_replay(tmp_path, stub_client):
+    client = stub_client({("b", "a/1"): b"1", ("b", "a/2"): b"22"})
+    keys_file = _keys_file(tmp_path / "keys.txt", ["a/1", "missing/1", "a/2", "", "missing/2"])
+    failed_file = tmp_path / "failed.txt"
+
+    assert download_keys(tmp_path / "out", "b", client, keys_file, failed_keys_file=failed_file) == (2, 2)
+    assert (tmp_path / "out" / "a" / "2").read_bytes() == b"22"
+    assert sorted(failed_file.read_text().split()) == ["missing/1", "missing/2"]
+    assert not (tmp_path / "failed.txt.partial").exists()
+
+    client.put("b", "missing/1", b"m")
+    client.put("b", "missing/2", b"m")
+    # replaying from the same path reads the file while failures are written
+    assert download_keys(tmp_path / "out", "b", client, failed_file, failed_keys_file=failed_file) == (2, 0)
+
+
+def test_failed_keys_removes_stale_file_after_clean_run(tmp_path, stub_client):
+    client = stub_client({("b", "a/1"): b"1"})
+    failed_file = tmp_path / "failed.txt"
+    failed_file.write_text("old\n")
+
+    download_keys(tmp_path / "out", "b", client, _keys_file(tmp_path / "keys.txt", ["a/1"]), failed_keys_file=failed_file)
+
+    assert not failed_file.exists()
+
+
+def test_interrupted_replay_keeps_keys_file(tmp_path, stub_client, monkeypatch):
+    keys = [f"missing/{i}" for i in range(1005)]
+    failed_file = _keys_file(tmp_path / "failed.txt", keys)
+    client = stub_client()
+    attempted = []
+
+    def download_file(bucket, key, dest_pathname):
+        attempted.append(key)
+        if len(attempted) == 50:
+            raise KeyboardInterrupt
+        raise Exception("404")
+
+    client.download_file = download_file
+    monkeypatch.setattr(download, "IN_FLIGHT_PER_WORKER", 1)
+    try:
+        download_keys(tmp_path / "out", "b", client, failed_file, max_workers=1, failed_keys_file=failed_file)
+    except KeyboardInterrupt:
+        pass
+    else:
+        raise AssertionError("KeyboardInterrupt was not raised")
+
+    assert failed_file.read_text().split() == keys
+
+
+def test_failed_keys_without_path_only_counts(tmp_path):
+    with FailedKeys(None) as failed_keys:
+        failed_keys.add("a")
+    assert failed_keys.count == 1
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_download_keys_bounds_keys_in_flight(tmp_path, stub_client, monkeypatch):
+    keys = [f"d{i % 7}/{i}" for i in range(500)]
+    client = stub_client({("b", k): b"x" for k in keys})
+    read = []
+    iter_keys_file = download.iter_keys_file
+    max_workers, in_flight_per_worker = 3, 2
+    max_in_flight = max_workers * in_flight_per_worker
+
+    def counting_iter_keys_file(keys_file):
+        for k in iter_keys_file(keys_file):
+            downloaded = sum(1 for name, _ in list(client.calls) if name == "download_file")
+            assert len(read) - downloaded <= max_in_flight
+            read.append(k)
+            yield k
+
+    monkeypatch.setattr(download, "iter_keys_file", counting_iter_keys_file)
+    monkeypatch.setattr(download, "IN_FLIGHT_PER_WORKER", in_flight_per_worker)
+
+    result = download_keys(tmp_path / "out", "b", client, _keys_file(tmp_path / "keys.txt", keys), max_workers=max_workers)
+
+    assert result == (500, 0)
+    assert len(read) == 500
+
+
+def test_makedirs_skips_created_folders(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(download.os, "makedirs", lambda *args, **kwargs: calls.append(args))
+    created = set()
+
+    for _ in range(3):
+        download.makedirs(str(tmp_path / "a"), created)
+    download.makedirs(str(tmp_path / "b"), created)
+
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("use_keys_file", [True, False])
+def test_download_again_into_removed_folder(tmp_path, stub_client, use_keys_file):
+    client = stub_client({("b", "a/1"): b"1"})
+    out = tmp_path / "out"
+    keys_file = _keys_file(tmp_path / "keys.txt", ["a/1"]) if use_keys_file else None
+
+    assert download_bucket(out, "b", client, keys_file=keys_file) == (1, 0)
+    shutil.rmtree(out)
+    assert download_bucket(out, "b", client, keys_file=keys_file) == (1, 0)
+    assert (out / "a" / "1").read_bytes() == b"1"
+
+
+def test_download_bucket_missing_keys_file_does_not_list_bucket(tmp_path, stub_client):
+    client = stub_client({("b", "a/1"): b"1"})
+
+    assert download_bucket(tmp_path / "out", "b", client, keys_file=tmp_path / "nope.txt") == (0, 0)
+    assert client.calls == []